@@ -7,7 +7,7 @@ import click
 from pupil_labs.realtime_api.device import Device
 from pupil_labs.realtime_api.discovery import Network
 
-from pupil_labs.invisible_lsl_relay import relay
+from pupil_labs.invisible_lsl_relay import relay, replay
 
 logger = logging.getLogger(__name__)
 
@@ -139,6 +139,21 @@ def print_device_list(network, n_reload):
         )
 
 
+def setup_logging(log_file_name):
+    logging.basicConfig(
+        level=logging.DEBUG,
+        filename=log_file_name,
+        format='%(asctime)s:%(name)s:%(levelname)s:%(message)s',
+    )
+    # set up console logging
+    stream_handler = logging.StreamHandler()
+    stream_handler.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(name)s\t| %(levelname)s\t| %(message)s')
+    stream_handler.setFormatter(formatter)
+
+    logging.getLogger().addHandler(stream_handler)
+
+
 def epoch_is(year, month, day):
     epoch = time.gmtime(0)
     return epoch.tm_year == year and epoch.tm_mon == month and epoch.tm_mday == day
@@ -181,18 +196,7 @@ def relay_setup_and_start(
     time_sync_interval: int,
 ):
     try:
-        logging.basicConfig(
-            level=logging.DEBUG,
-            filename=log_file_name,
-            format='%(asctime)s:%(name)s:%(levelname)s:%(message)s',
-        )
-        # set up console logging
-        stream_handler = logging.StreamHandler()
-        stream_handler.setLevel(logging.INFO)
-        formatter = logging.Formatter('%(name)s\t| %(levelname)s\t| %(message)s')
-        stream_handler.setFormatter(formatter)
-
-        logging.getLogger().addHandler(stream_handler)
+        setup_logging(log_file_name)
 
         # check epoch time
         assert epoch_is(
@@ -212,3 +216,62 @@ def relay_setup_and_start(
         logger.info("The relay was closed via keyboard interrupt")
     finally:
         logging.shutdown()
+
+
+@click.command()
+@click.argument(
+    "recording_dir",
+    type=click.Path(exists=True, file_okay=False),
+)
+@click.option(
+    "--speed",
+    default=1.0,
+    type=click.FloatRange(min=0),
+    help=(
+        "Playback rate relative to the original recording. "
+        "Set to 0 to replay as fast as possible."
+    ),
+)
+@click.option(
+    "--log_file_name",
+    default="pi_lsl_replay.log",
+    help="Name and path where the log file is saved.",
+)
+@click.option(
+    "--device_identifier",
+    default="replay",
+    help="Device identifier used for the source id of the lsl outlets.",
+)
+@click.option(
+    "--world_camera_serial",
+    default="default",
+    help="World camera serial number written to the outlet metadata.",
+)
+@click.option(
+    "--outlet_prefix",
+    default="pupil_invisible",
+    help="Pass optional names to the lsl outlets.",
+)
+def replay_setup_and_start(
+    recording_dir: str,
+    speed: float,
+    log_file_name: str,
+    device_identifier: str,
+    world_camera_serial: str,
+    outlet_prefix: str,
+):
+    """Replay a Pupil Cloud recording export (gaze.csv, events.csv) to LSL"""
+    try:
+        setup_logging(log_file_name)
+        player = replay.Replay(
+            recording_dir=recording_dir,
+            device_identifier=device_identifier,
+            outlet_prefix=outlet_prefix,
+            world_camera_serial=world_camera_serial,
+            speed=speed or None,
+        )
+        player.replay()
+    except KeyboardInterrupt:
+        logger.info("The replay was closed via keyboard interrupt")
+    finally:
+        logging.shutdown()
@@ -45,8 +45,13 @@ class PupilInvisibleOutlet:
         except Exception as exc:
             logger.error(f"Error extracting from sample: {exc}")
             logger.debug(str(sample))
-            return
+            return False
         self._outlet.push_sample(sample_to_push, timestamp_to_push)
+        return True
+
+    def close(self):
+        # pylsl destroys the underlying outlet once it is garbage collected
+        self._outlet = None
 
 
 class PupilInvisibleGazeOutlet(PupilInvisibleOutlet):
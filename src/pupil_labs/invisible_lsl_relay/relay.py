@@ -1,5 +1,9 @@
+import array
 import asyncio
 import logging
+import math
+import random
+import time
 
 from pupil_labs.realtime_api import Device, StatusUpdateNotifier, receive_gaze_data
 from pupil_labs.realtime_api.models import Event, Sensor
@@ -8,6 +12,8 @@ from pupil_labs.invisible_lsl_relay import outlets
 
 logger = logging.getLogger(__name__)
 
+DELAY_RESERVOIR_SIZE = 10000
+
 
 class Relay:
     def __init__(
@@ -20,6 +26,7 @@ class Relay:
     ):
         self.device_ip = device_ip
         self.device_port = device_port
+        self.device_identifier = device_identifier
         self.receiver = DataReceiver(device_ip, device_port)
         self.gaze_outlet = outlets.PupilInvisibleGazeOutlet(
             device_id=device_identifier,
@@ -35,6 +42,9 @@ class Relay:
         self.publishing_gaze_task = None
         self.publishing_event_task = None
         self.receiving_task = None
+        self.time_sync_task = None
+        self.gaze_statistics = StreamStatistics('gaze')
+        self.event_statistics = StreamStatistics('event')
 
     async def receive_gaze_sample(self):
         while True:
@@ -52,7 +62,7 @@ class Relay:
         while True:
             try:
                 sample = await asyncio.wait_for(self.gaze_sample_queue.get(), timeout)
-                self.gaze_outlet.push_sample_to_outlet(sample)
+                push_and_count(self.gaze_outlet, self.gaze_statistics, sample)
                 if missing_sample_duration:
                     missing_sample_duration = 0
             except asyncio.TimeoutError:
@@ -65,7 +75,7 @@ class Relay:
     async def publish_event_from_queue(self):
         while True:
             event = await self.receiver.event_queue.get()
-            self.event_outlet.push_sample_to_outlet(event)
+            push_and_count(self.event_outlet, self.event_statistics, event)
 
     async def start_receiving_task(self):
         if self.receiving_task:
@@ -91,28 +101,92 @@ class Relay:
             self.publish_event_from_queue()
         )
 
-    async def relay_receiver_to_publisher(self, time_sync_interval):
-        await self.receiver.make_status_update_notifier()
-        await self.start_receiving_task()
-        await self.start_publishing_gaze()
-        await self.start_publishing_event()
-        tasks = [
-            self.receiving_task,
-            self.publishing_gaze_task,
-            self.publishing_event_task,
-        ]
-        # start time sync task
-        if time_sync_interval:
-            time_sync_task = asyncio.create_task(
-                send_events_in_interval(
-                    self.device_ip, self.device_port, time_sync_interval
+    async def relay_receiver_to_publisher(self, time_sync_interval, flush_timeout=5):
+        try:
+            await self.receiver.make_status_update_notifier()
+            await self.start_receiving_task()
+            await self.start_publishing_gaze()
+            await self.start_publishing_event()
+            tasks = [
+                self.receiving_task,
+                self.publishing_gaze_task,
+                self.publishing_event_task,
+            ]
+            # start time sync task
+            if time_sync_interval:
+                self.time_sync_task = asyncio.create_task(
+                    send_events_in_interval(
+                        self.device_ip, self.device_port, time_sync_interval
+                    )
                 )
+                tasks.append(self.time_sync_task)
+
+            done, pending = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_COMPLETED
+            )
+            handle_done_pending_tasks(done, pending)
+        finally:
+            await self.shutdown(time_sync_interval, flush_timeout)
+
+    async def shutdown(self, time_sync_interval, flush_timeout):
+        # stop receiving before flushing such that the queues can only shrink
+        await cancel_tasks(
+            [
+                self.receiving_task,
+                self.time_sync_task,
+                self.publishing_gaze_task,
+                self.publishing_event_task,
+            ],
+            flush_timeout,
+        )
+        try:
+            await self.receiver.cleanup()
+        except Exception:
+            logger.warning('The status updates could not be stopped.', exc_info=True)
+
+        self.flush_queues(flush_timeout)
+        # only contact the device if the relay was started successfully
+        if time_sync_interval and self.receiver.notifier:
+            await self.send_final_time_sync_event(flush_timeout)
+        self.gaze_outlet.close()
+        self.event_outlet.close()
+        self.log_session_summary()
+
+    def flush_queues(self, timeout):
+        deadline = time.monotonic() + timeout
+        # events are flushed first, as the time sync events are required for the
+        # post-hoc time alignment
+        flush_queue(
+            self.receiver.event_queue,
+            self.event_outlet,
+            self.event_statistics,
+            deadline,
+        )
+        flush_queue(
+            self.gaze_sample_queue, self.gaze_outlet, self.gaze_statistics, deadline
+        )
+
+    async def send_final_time_sync_event(self, timeout):
+        try:
+            event = await asyncio.wait_for(
+                send_timesync_event(
+                    self.device_ip, self.device_port, 'lsl.time_sync.final'
+                ),
+                timeout,
+            )
+        except Exception:
+            logger.warning(
+                'The final time sync event could not be sent.', exc_info=True
             )
-            tasks.append(time_sync_task)
+            return
+        # status updates are no longer received, so the event is pushed directly
+        push_and_count(self.event_outlet, self.event_statistics, EventAdapter(event))
 
-        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
-        handle_done_pending_tasks(done, pending)
-        await self.receiver.cleanup()
+    def log_session_summary(self):
+        logger.info(f'Session summary for device {self.device_identifier}:')
+        for statistics in (self.gaze_statistics, self.event_statistics):
+            logger.info(f'\t{statistics.summary()}')
+        logger.info(f'\tgaze sensor reconnects: {self.receiver.n_gaze_reconnects}')
 
 
 class DataReceiver:
@@ -121,32 +195,122 @@ class DataReceiver:
         self.device_port = device_port
         self.notifier = None
         self.gaze_sensor_url = None
+        self.gaze_sensor_connected = None
+        self.n_gaze_reconnects = 0
         self.event_queue = asyncio.Queue()
 
     async def on_update(self, component):
         if isinstance(component, Sensor):
             if component.sensor == 'gaze' and component.conn_type == 'DIRECT':
                 self.gaze_sensor_url = component.url
+                self.update_gaze_sensor_connection(component.connected)
         elif isinstance(component, Event):
             adapted_event = EventAdapter(component)
             await self.event_queue.put(adapted_event)
 
+    def update_gaze_sensor_connection(self, connected):
+        # None until the sensor was connected for the first time
+        if connected:
+            if self.gaze_sensor_connected is False:
+                self.n_gaze_reconnects += 1
+            self.gaze_sensor_connected = True
+        elif self.gaze_sensor_connected:
+            self.gaze_sensor_connected = False
+
     async def make_status_update_notifier(self):
         async with Device(self.device_ip, self.device_port) as device:
-            self.notifier = StatusUpdateNotifier(device, callbacks=[self.on_update])
-            await self.notifier.receive_updates_start()
+            notifier = StatusUpdateNotifier(device, callbacks=[self.on_update])
+            await notifier.receive_updates_start()
+            self.notifier = notifier
 
     async def cleanup(self):
-        await self.notifier.receive_updates_stop()
+        if self.notifier:
+            await self.notifier.receive_updates_stop()
 
 
+# __slots__ avoids a per-instance __dict__ for queued events. Gaze data is queued
+# as received, since the realtime API already provides it as named tuples.
 class EventAdapter:
+    __slots__ = ('name', 'timestamp_unix_ns', 'timestamp_unix_seconds')
+
     def __init__(self, sample):
         self.name = sample.name
         self.timestamp_unix_ns = sample.timestamp
         self.timestamp_unix_seconds = self.timestamp_unix_ns * 1e-9
 
 
+class StreamStatistics:
+    def __init__(self, name, reservoir_size=DELAY_RESERVOIR_SIZE):
+        self.name = name
+        self.n_relayed = 0
+        self.n_dropped = 0
+        # Delays between the host time at push and the device timestamp in
+        # seconds. They include the offset between both clocks. A fixed-size
+        # random sample of them is kept to bound memory in long sessions.
+        self.reservoir_size = reservoir_size
+        self.push_delays = array.array('d')
+
+    def record_relayed(self, sample):
+        self.n_relayed += 1
+        push_delay = time.time() - sample.timestamp_unix_seconds
+        if len(self.push_delays) < self.reservoir_size:
+            self.push_delays.append(push_delay)
+        else:
+            index = random.randrange(self.n_relayed)
+            if index < self.reservoir_size:
+                self.push_delays[index] = push_delay
+
+    def summary(self):
+        summary = f'{self.name}: {self.n_relayed} relayed, {self.n_dropped} dropped'
+        if self.push_delays:
+            sorted_delays = sorted(self.push_delays)
+            percentiles_ms = '/'.join(
+                f'{percentile(sorted_delays, p) * 1e3:.1f}' for p in (50, 95, 99)
+            )
+            summary += (
+                ', host push time minus device timestamp '
+                f'(includes clock offset) p50/p95/p99: {percentiles_ms} ms'
+            )
+        return summary
+
+
+def percentile(sorted_values, p):
+    # nearest-rank percentile of an already sorted, non-empty sequence
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def push_and_count(outlet, statistics, sample):
+    if outlet.push_sample_to_outlet(sample):
+        statistics.record_relayed(sample)
+    else:
+        statistics.n_dropped += 1
+
+
+def flush_queue(queue, outlet, statistics, deadline):
+    while not queue.empty() and time.monotonic() < deadline:
+        push_and_count(outlet, statistics, queue.get_nowait())
+    if not queue.empty():
+        logger.warning(
+            'Could not flush %i %s samples in time.', queue.qsize(), statistics.name
+        )
+        statistics.n_dropped += queue.qsize()
+
+
+async def cancel_tasks(tasks, timeout):
+    deadline = time.monotonic() + timeout
+    pending = {task for task in tasks if task is not None}
+    while pending and time.monotonic() < deadline:
+        for task in pending:
+            task.cancel()
+        # asyncio.wait_for can swallow a cancellation if the awaited future
+        # completes at the same time, so cancel until all tasks have stopped
+        remaining = deadline - time.monotonic()
+        _, pending = await asyncio.wait(pending, timeout=min(0.1, remaining))
+    if pending:
+        logger.warning('Could not cancel %i tasks in time: %s', len(pending), pending)
+
+
 def handle_done_pending_tasks(done, pending):
     for done_task in done:
         try:
@@ -176,4 +340,4 @@ async def send_events_in_interval(device_ip, device_port, sec=60):
 
 async def send_timesync_event(device_ip, device_port, message: str):
     async with Device(device_ip, device_port) as device:
-        await device.send_event(message)
+        return await device.send_event(message)
@@ -0,0 +1,166 @@
+import csv
+import heapq
+import logging
+import os
+import time
+
+from pupil_labs.invisible_lsl_relay import outlets
+
+logger = logging.getLogger(__name__)
+
+GAZE_FILE_NAME = 'gaze.csv'
+EVENTS_FILE_NAME = 'events.csv'
+
+TIMESTAMP_COLUMN = 'timestamp [ns]'
+GAZE_X_COLUMN = 'gaze x [px]'
+GAZE_Y_COLUMN = 'gaze y [px]'
+EVENT_NAME_COLUMN = 'name'
+
+GAZE_KIND = 'gaze'
+EVENT_KIND = 'event'
+
+
+class Replay:
+    """Replays a Pupil Cloud recording export through the LSL outlets.
+
+    ``speed`` is the playback rate relative to the original recording. Pass
+    ``None`` to push samples as fast as possible.
+    """
+
+    def __init__(
+        self,
+        recording_dir,
+        device_identifier,
+        outlet_prefix,
+        world_camera_serial,
+        speed=1.0,
+    ):
+        if speed is not None and speed <= 0:
+            raise ValueError('Replay speed must be positive.')
+        self.recording_dir = recording_dir
+        self.speed = speed
+        self.gaze_outlet = outlets.PupilInvisibleGazeOutlet(
+            device_id=device_identifier,
+            outlet_prefix=outlet_prefix,
+            world_camera_serial=world_camera_serial,
+        )
+        self.event_outlet = outlets.PupilInvisibleEventOutlet(
+            device_id=device_identifier,
+            outlet_prefix=outlet_prefix,
+            world_camera_serial=world_camera_serial,
+        )
+        self.n_gaze_samples = 0
+        self.n_events = 0
+        # time spent in the outlets only, excluding reading and merging the files
+        self.push_duration = 0.0
+
+    def replay(self):
+        samples = merge_recording_samples(self.recording_dir)
+        replay_start = time.time()
+        recording_start = None
+        for kind, sample in samples:
+            if recording_start is None:
+                recording_start = sample.timestamp_unix_seconds
+            if self.speed is not None:
+                recording_offset = sample.timestamp_unix_seconds - recording_start
+                recording_offset /= self.speed
+                wait_duration = replay_start + recording_offset - time.time()
+                if wait_duration > 0:
+                    time.sleep(wait_duration)
+                # shift the recorded timestamps such that the replay appears live
+                sample.timestamp_unix_seconds = replay_start + recording_offset
+            else:
+                # at maximum speed, the recorded time spacing cannot be kept
+                # without pushing timestamps far into the future
+                sample.timestamp_unix_seconds = time.time()
+            push_start = time.perf_counter()
+            if kind == GAZE_KIND:
+                pushed = self.gaze_outlet.push_sample_to_outlet(sample)
+            else:
+                pushed = self.event_outlet.push_sample_to_outlet(sample)
+            self.push_duration += time.perf_counter() - push_start
+            if not pushed:
+                continue
+            if kind == GAZE_KIND:
+                self.n_gaze_samples += 1
+            else:
+                self.n_events += 1
+        replay_duration = time.time() - replay_start
+        self.log_statistics(replay_duration)
+
+    def log_statistics(self, replay_duration):
+        n_samples = self.n_gaze_samples + self.n_events
+        logger.info(
+            'Replayed %i gaze samples and %i events in %.2f seconds.',
+            self.n_gaze_samples,
+            self.n_events,
+            replay_duration,
+        )
+        # the throughput is only meaningful if the replay is not paced
+        if self.speed is None and self.push_duration > 0:
+            logger.info(
+                'Outlet throughput: %.0f samples per second.',
+                n_samples / self.push_duration,
+            )
+
+
+class GazeReplaySample:
+    __slots__ = ('x', 'y', 'timestamp_unix_seconds')
+
+    def __init__(self, x, y, timestamp_unix_seconds):
+        self.x = x
+        self.y = y
+        self.timestamp_unix_seconds = timestamp_unix_seconds
+
+
+class EventReplaySample:
+    __slots__ = ('name', 'timestamp_unix_seconds')
+
+    def __init__(self, name, timestamp_unix_seconds):
+        self.name = name
+        self.timestamp_unix_seconds = timestamp_unix_seconds
+
+
+def merge_recording_samples(recording_dir):
+    """Lazily merges gaze samples and events of a recording by timestamp"""
+    gaze_path = os.path.join(recording_dir, GAZE_FILE_NAME)
+    events_path = os.path.join(recording_dir, EVENTS_FILE_NAME)
+    if not os.path.isfile(gaze_path):
+        raise FileNotFoundError(f'No {GAZE_FILE_NAME} found in {recording_dir}')
+    sources = [read_gaze_samples(gaze_path)]
+    if os.path.isfile(events_path):
+        sources.append(read_events(events_path))
+    else:
+        logger.warning(f'No {EVENTS_FILE_NAME} found in {recording_dir}')
+    return (
+        (kind, sample)
+        for _, kind, sample in heapq.merge(*sources, key=lambda entry: entry[0])
+    )
+
+
+def read_gaze_samples(path):
+    # rows are read one at a time such that long recordings are never fully
+    # loaded into memory
+    for row in read_csv_rows(path):
+        timestamp_ns = int(row[TIMESTAMP_COLUMN])
+        sample = GazeReplaySample(
+            x=float(row[GAZE_X_COLUMN]),
+            y=float(row[GAZE_Y_COLUMN]),
+            timestamp_unix_seconds=timestamp_ns * 1e-9,
+        )
+        yield timestamp_ns, GAZE_KIND, sample
+
+
+def read_events(path):
+    for row in read_csv_rows(path):
+        timestamp_ns = int(row[TIMESTAMP_COLUMN])
+        sample = EventReplaySample(
+            name=row[EVENT_NAME_COLUMN],
+            timestamp_unix_seconds=timestamp_ns * 1e-9,
+        )
+        yield timestamp_ns, EVENT_KIND, sample
+
+
+def read_csv_rows(path):
+    with open(path, newline='') as csv_file:
+        yield from csv.DictReader(csv_file)
@@ -0,0 +1,187 @@
+import asyncio
+import time
+import types
+
+import pytest
+
+from pupil_labs.invisible_lsl_relay import relay
+
+
+class StubOutlet:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.samples = []
+
+    def push_sample_to_outlet(self, sample):
+        if self.fail:
+            return False
+        self.samples.append(sample)
+        return True
+
+    def close(self):
+        pass
+
+
+class StubSample:
+    def __init__(self):
+        self.timestamp_unix_seconds = time.time()
+
+
+@pytest.mark.parametrize(
+    "n, p, expected",
+    [
+        (10, 0, 1),
+        (10, 10, 1),
+        (10, 50, 5),
+        (10, 95, 10),
+        (10, 100, 10),
+        (1, 50, 1),
+        (5, 50, 3),
+        (5, 90, 5),
+        (7, 50, 4),
+        (7, 25, 2),
+    ],
+)
+def test_percentile(n, p, expected):
+    assert relay.percentile(list(range(1, n + 1)), p) == expected
+
+
+def test_update_gaze_sensor_connection_counts_reconnects():
+    receiver = relay.DataReceiver('localhost', 8080)
+    # disconnected before the first connection is not a reconnect
+    for connected in (False, True, False, True, True, False, True):
+        receiver.update_gaze_sensor_connection(connected)
+    assert receiver.n_gaze_reconnects == 2
+    assert receiver.gaze_sensor_connected is True
+
+
+def test_push_and_count():
+    statistics = relay.StreamStatistics('gaze')
+    relay.push_and_count(StubOutlet(), statistics, StubSample())
+    relay.push_and_count(StubOutlet(fail=True), statistics, StubSample())
+    assert statistics.n_relayed == 1
+    assert statistics.n_dropped == 1
+    assert len(statistics.push_delays) == 1
+
+
+def test_stream_statistics_bounds_push_delays():
+    statistics = relay.StreamStatistics('gaze', reservoir_size=5)
+    for _ in range(100):
+        statistics.record_relayed(StubSample())
+    assert statistics.n_relayed == 100
+    assert len(statistics.push_delays) == 5
+    assert 'p50/p95/p99' in statistics.summary()
+
+
+def test_flush_queue_pushes_all_samples():
+    queue = asyncio.Queue()
+    for _ in range(3):
+        queue.put_nowait(StubSample())
+    outlet = StubOutlet()
+    statistics = relay.StreamStatistics('gaze')
+    relay.flush_queue(queue, outlet, statistics, time.monotonic() + 10)
+    assert queue.empty()
+    assert len(outlet.samples) == 3
+    assert statistics.n_relayed == 3
+    assert statistics.n_dropped == 0
+
+
+def test_flush_queue_counts_remaining_samples_as_dropped():
+    queue = asyncio.Queue()
+    for _ in range(3):
+        queue.put_nowait(StubSample())
+    outlet = StubOutlet()
+    statistics = relay.StreamStatistics('gaze')
+    relay.flush_queue(queue, outlet, statistics, time.monotonic() - 1)
+    assert not outlet.samples
+    assert statistics.n_relayed == 0
+    assert statistics.n_dropped == 3
+
+
+def test_shutdown_skips_final_event_if_not_started(monkeypatch):
+    async def send_timesync_event(*args):
+        raise AssertionError('The device should not be contacted.')
+
+    monkeypatch.setattr(relay, 'send_timesync_event', send_timesync_event)
+
+    async def shutdown():
+        adapter = relay.Relay('localhost', 8080, 'test', 'test', 'default')
+        adapter.gaze_outlet = StubOutlet()
+        adapter.event_outlet = StubOutlet()
+        adapter.gaze_sample_queue.put_nowait(StubSample())
+        await adapter.shutdown(time_sync_interval=60, flush_timeout=1)
+        return adapter
+
+    adapter = asyncio.run(shutdown())
+    assert len(adapter.gaze_outlet.samples) == 1
+    assert not adapter.event_outlet.samples
+
+
+class OrderRecordingOutlet:
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+
+    def push_sample_to_outlet(self, sample):
+        self.log.append((self.name, getattr(sample, 'name', 'sample')))
+        return True
+
+    def close(self):
+        self.log.append((self.name, 'close'))
+
+
+class StubNotifier:
+    async def receive_updates_stop(self):
+        pass
+
+
+def test_shutdown_order(monkeypatch):
+    async def send_timesync_event(device_ip, device_port, message):
+        return types.SimpleNamespace(name=message, timestamp=time.time_ns())
+
+    monkeypatch.setattr(relay, 'send_timesync_event', send_timesync_event)
+    log = []
+
+    async def shutdown():
+        adapter = relay.Relay('localhost', 8080, 'test', 'test', 'default')
+        adapter.gaze_outlet = OrderRecordingOutlet('gaze', log)
+        adapter.event_outlet = OrderRecordingOutlet('event', log)
+        adapter.receiver.notifier = StubNotifier()
+        adapter.gaze_sample_queue.put_nowait(StubSample())
+        event = types.SimpleNamespace(name='lsl.time_sync.0', timestamp=time.time_ns())
+        adapter.receiver.event_queue.put_nowait(relay.EventAdapter(event))
+        await adapter.shutdown(time_sync_interval=60, flush_timeout=1)
+
+    asyncio.run(shutdown())
+    assert log == [
+        ('event', 'lsl.time_sync.0'),
+        ('gaze', 'sample'),
+        ('event', 'lsl.time_sync.final'),
+        ('gaze', 'close'),
+        ('event', 'close'),
+    ]
+
+
+def test_cancel_tasks_gives_up_after_timeout():
+    async def cancel_stubborn_task():
+        stop = False
+
+        async def swallow_cancellation():
+            while not stop:
+                try:
+                    await asyncio.sleep(1)
+                except asyncio.CancelledError:
+                    pass
+
+        task = asyncio.create_task(swallow_cancellation())
+        await asyncio.sleep(0)
+        start = time.monotonic()
+        await relay.cancel_tasks([task, None], timeout=0.3)
+        duration = time.monotonic() - start
+        assert not task.done()
+        stop = True
+        task.cancel()
+        await asyncio.wait([task])
+        return duration
+
+    assert asyncio.run(cancel_stubborn_task()) < 1
@@ -0,0 +1,109 @@
+import pytest
+
+from pupil_labs.invisible_lsl_relay import replay
+
+GAZE_CSV = (
+    'section id,recording id,timestamp [ns],gaze x [px],gaze y [px],worn\n'
+    'a,b,1000000000,1.5,2.5,1\n'
+    'a,b,1004000000,3.0,4.0,1\n'
+    'a,b,1008000000,5.0,6.0,0\n'
+)
+EVENTS_CSV = (
+    'recording id,timestamp [ns],name,type\n'
+    'b,1002000000,lsl.time_sync.0,recording\n'
+    'b,1010000000,lsl.time_sync.1,recording\n'
+)
+
+
+class StubOutlet:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.samples = []
+
+    def push_sample_to_outlet(self, sample):
+        if self.fail:
+            return False
+        self.samples.append(sample)
+        return True
+
+
+def write_recording(path, with_events=True):
+    (path / replay.GAZE_FILE_NAME).write_text(GAZE_CSV)
+    if with_events:
+        (path / replay.EVENTS_FILE_NAME).write_text(EVENTS_CSV)
+    return str(path)
+
+
+def test_merge_recording_samples_interleaves_by_timestamp(tmp_path):
+    recording_dir = write_recording(tmp_path)
+    samples = list(replay.merge_recording_samples(recording_dir))
+    assert [kind for kind, _ in samples] == [
+        replay.GAZE_KIND,
+        replay.EVENT_KIND,
+        replay.GAZE_KIND,
+        replay.GAZE_KIND,
+        replay.EVENT_KIND,
+    ]
+    assert samples[0][1].x == 1.5
+    assert samples[0][1].y == 2.5
+    assert samples[0][1].timestamp_unix_seconds == 1.0
+    assert samples[1][1].name == 'lsl.time_sync.0'
+
+
+def test_merge_recording_samples_without_events(tmp_path):
+    recording_dir = write_recording(tmp_path, with_events=False)
+    samples = list(replay.merge_recording_samples(recording_dir))
+    assert [kind for kind, _ in samples] == [replay.GAZE_KIND] * 3
+
+
+def test_replay_counts_only_pushed_samples(tmp_path):
+    recording_dir = write_recording(tmp_path)
+    player = replay.Replay(
+        recording_dir=recording_dir,
+        device_identifier='test',
+        outlet_prefix='test',
+        world_camera_serial='default',
+        speed=None,
+    )
+    player.gaze_outlet = StubOutlet()
+    player.event_outlet = StubOutlet(fail=True)
+    player.replay()
+    assert player.n_gaze_samples == 3
+    assert player.n_events == 0
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, duration):
+        self.sleeps.append(duration)
+        self.now += duration
+
+
+def test_paced_replay_shifts_and_scales_timestamps(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(replay, 'time', clock)
+    recording_dir = write_recording(tmp_path, with_events=False)
+    player = replay.Replay(
+        recording_dir=recording_dir,
+        device_identifier='test',
+        outlet_prefix='test',
+        world_camera_serial='default',
+        speed=4.0,
+    )
+    player.gaze_outlet = StubOutlet()
+    player.replay()
+    timestamps = [
+        sample.timestamp_unix_seconds for sample in player.gaze_outlet.samples
+    ]
+    # recorded samples are 4 ms apart, replayed at 4x speed
+    assert timestamps == pytest.approx([100.0, 100.001, 100.002])
+    assert clock.sleeps == pytest.approx([0.001, 0.001])